@@ -1,15 +1,70 @@
-MISTAL_API_KEY = "Ваш API"
-
 from mistralai import Mistral
+import httpx
+import asyncio
 import base64
+import collections
+import functools
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import time
 from typing import List, Tuple, Dict, Any
 from abc import ABC, abstractmethod
 
+@functools.lru_cache(maxsize=64)
+def _encode_image_cached(image_path: str, mtime_ns: int, size: int) -> str:
+    """
+    Кодирует файл изображения в base64 с кешированием.
+    Ключ включает mtime и размер, поэтому изменённый файл
+    перекодируется, а повторная отправка того же изображения
+    обходится без чтения с диска.
+
+    Файл кодируется потоково, блоками по 57 КБ (кратно трём байтам,
+    чтобы границы base64 совпадали), а не целиком в памяти.
+    """
+    out = io.BytesIO()
+    with open(image_path, "rb") as image_file:
+        while chunk := image_file.read(57 * 1024):
+            out.write(base64.b64encode(chunk))
+    return out.getvalue().decode('ascii')
+
+def _image_mime(image_path: str) -> str:
+    """
+    Определяет MIME-тип изображения по сигнатуре файла,
+    чтобы не объявлять PNG/WebP как image/jpeg и не заставлять
+    сервер перекодировать или отклонять картинку.
+    """
+    try:
+        with open(image_path, "rb") as image_file:
+            header = image_file.read(12)
+    except OSError:
+        header = b""
+
+    if header.startswith(b"\x89PNG"):
+        return "image/png"
+    if header.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if header.startswith(b"RIFF") and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header.startswith(b"GIF8"):
+        return "image/gif"
+
+    guessed, _ = mimetypes.guess_type(image_path)
+    return guessed or "image/jpeg"
+
 class RequestStrategy(ABC):
     """
     Абстрактный класс, определяющий интерфейс для всех стратегий запросов.
     """
 
+    # Нужен ли стратегии путь к изображению и из какого списка
+    # моделей выбирать. Фасад читает эти атрибуты вместо isinstance,
+    # поэтому новые стратегии подключаются без правок ChatFacade
+    needs_image: bool = False
+    model_type: str = "text"
+
     @abstractmethod
     def execute(self, text: str, model: str, history: list = None, image_path: str = None) -> dict:
         """
@@ -18,17 +73,47 @@ class RequestStrategy(ABC):
         """
         pass
 
+    @abstractmethod
+    async def aexecute(self, text: str, model: str, history: list = None, image_path: str = None) -> dict:
+        """
+        Асинхронный вариант execute.
+        Позволяет отправлять несколько запросов параллельно через asyncio.gather.
+        """
+        pass
+
 class TextRequestStrategy(RequestStrategy):
     """
     Конкретная реализация стратегии для отправки текстовых запросов.
     """
-    def __init__(self, api_key: str) -> None:
-        self.api_key = api_key
-        self.client = Mistral(api_key=self.api_key)
+    def __init__(self, client: Mistral, cache_enabled: bool = False, cache_size: int = 128) -> None:
+        self.client = client
+        # Кеш ответов по точному совпадению (model, messages).
+        # Выключен по умолчанию: повторный запрос к модели недетерминирован
+        self.cache_enabled = cache_enabled
+        self._cache: collections.OrderedDict[bytes, dict] = collections.OrderedDict()
+        self._cache_size = cache_size
+
+    def _cache_key(self, model: str, messages: list) -> bytes:
+        """Хеш пары (модель, сообщения) для кеша ответов."""
+        payload = json.dumps((model, messages), sort_keys=True, ensure_ascii=False)
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).digest()
+
+    def _cache_get(self, key: bytes) -> dict | None:
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        return None
+
+    def _cache_put(self, key: bytes, result: dict) -> None:
+        self._cache[key] = result
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
 
     def execute(self, text: str, model: str, history: list = None, image_path: str = None) -> dict:
         """
         Реализует отправку текстового запроса к API Mistral.
+        При включённом кеше повторный запрос с той же историей
+        возвращается без обращения к сети.
         """
         messages = []
         if history:
@@ -36,6 +121,12 @@ class TextRequestStrategy(RequestStrategy):
 
         messages.append({"role": "user", "content": text})
 
+        if self.cache_enabled:
+            key = self._cache_key(model, messages)
+            cached = self._cache_get(key)
+            if cached is not None:
+                return cached
+
         response = self.client.chat.complete(
             model=model,
             messages=messages
@@ -47,21 +138,93 @@ class TextRequestStrategy(RequestStrategy):
             "content": response.choices[0].message.content
         }
 
+        if self.cache_enabled:
+            self._cache_put(key, result)
+
+        return result
+
+    async def aexecute(self, text: str, model: str, history: list = None, image_path: str = None) -> dict:
+        """
+        Асинхронная отправка текстового запроса к API Mistral.
+        Не блокирует цикл событий на время сетевого запроса.
+        """
+        messages = []
+        if history:
+            messages.extend(history)
+
+        messages.append({"role": "user", "content": text})
+
+        if self.cache_enabled:
+            key = self._cache_key(model, messages)
+            cached = self._cache_get(key)
+            if cached is not None:
+                return cached
+
+        response = await self.client.chat.complete_async(
+            model=model,
+            messages=messages
+        )
+
+        result = {
+            "role": "assistant",
+            "content": response.choices[0].message.content
+        }
+
+        if self.cache_enabled:
+            self._cache_put(key, result)
+
         return result
 
 class ImageRequestStrategy(RequestStrategy):
     """
     Конкретная реализация стратегии для отправки запросов с изображением.
     """
-    def __init__(self, api_key: str) -> None:
-        self.api_key = api_key
-        self.client = Mistral(api_key=self.api_key)
+    needs_image = True
+    model_type = "image"
+
+    def __init__(self, client: Mistral) -> None:
+        self.client = client
+        # Кеш ссылок на загруженные изображения: (path, mtime_ns) -> url
+        self._upload_cache: dict[tuple[str, int], str] = {}
+        # Кеш готовых image_url-частей сообщения: тот же ключ
+        self._image_part_cache: dict[tuple[str, int], dict] = {}
+
+    def __upload_image(self, image_path: str) -> str:
+        """
+        Загружает изображение один раз через files API и возвращает
+        подписанную ссылку. Ссылка на локальный файл кешируется,
+        повторная отправка не загружает его заново.
+        """
+        st = os.stat(image_path)
+        cache_key = (image_path, st.st_mtime_ns)
+        if cache_key in self._upload_cache:
+            return self._upload_cache[cache_key]
+
+        with open(image_path, "rb") as image_file:
+            uploaded = self.client.files.upload(
+                file={"file_name": os.path.basename(image_path), "content": image_file.read()},
+                purpose="vision"
+            )
+        signed = self.client.files.get_signed_url(file_id=uploaded.id)
+        self._upload_cache[cache_key] = signed.url
+        return signed.url
+
+    def preupload(self, image_path: str) -> None:
+        """
+        Заранее прогревает кеш загрузки изображения.
+        Ошибки игнорируются: execute повторит попытку
+        и при необходимости откатится на base64.
+        """
+        try:
+            self.__upload_image(image_path)
+        except Exception:
+            pass
 
     def __encode_image(self, image_path: str) -> str:
         """Переводит изображение в формат base64"""
         try:
-            with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+            st = os.stat(image_path)
+            return _encode_image_cached(image_path, st.st_mtime_ns, st.st_size)
         except FileNotFoundError:
             print(f"Error: the file {image_path} was not found.")
             return ""
@@ -69,20 +232,20 @@ class ImageRequestStrategy(RequestStrategy):
             print(f"Error: {e}")
             return ""
 
-    def execute(self, text: str, model: str, history: list = None, image_path: str = None) -> dict:
+    def __build_messages(self, text: str, image_path: str) -> list:
         """
-        Реализует отправку мультимодального запроса, объединяющего текст и изображение.
+        Формирует сообщение для чата из текста и изображения.
+        Изображение передаётся ссылкой на загруженный файл
+        (без ~33% накладных расходов base64); при недоступности
+        files API используется data-URL как запасной вариант.
+        Готовая image_url-часть кешируется, поэтому при повторных
+        отправках того же файла пересобирается только текстовая часть.
         """
-        if not image_path:
-            return {"error": "Image path is required for ImageRequestStrategy."}
+        part = self.__image_part(image_path)
+        if part is None:
+            return []
 
-        # Получаем изображение в формате base64
-        base64_image = self.__encode_image(image_path)
-        if not base64_image:
-            return {"error": "Failed to encode image."}
-
-        # Формируем сообщение для чата
-        messages = [
+        return [
             {
                 "role": "user",
                 "content": [
@@ -90,14 +253,49 @@ class ImageRequestStrategy(RequestStrategy):
                         "type": "text",
                         "text": text
                     },
-                    {
-                        "type": "image_url",
-                        "image_url": f"data:image/jpeg;base64,{base64_image}"
-                    }
+                    part
                 ]
             }
         ]
 
+    def __image_part(self, image_path: str) -> dict | None:
+        """
+        Возвращает неизменяемую image_url-часть сообщения для файла,
+        собирая её (включая многомегабайтный data-URL в запасном
+        варианте) не чаще одного раза на версию файла.
+        """
+        try:
+            cache_key = (image_path, os.stat(image_path).st_mtime_ns)
+        except OSError:
+            cache_key = None
+        if cache_key is not None and cache_key in self._image_part_cache:
+            return self._image_part_cache[cache_key]
+
+        try:
+            image_url = self.__upload_image(image_path)
+        except Exception:
+            base64_image = self.__encode_image(image_path)
+            if not base64_image:
+                return None
+            image_url = f"data:{_image_mime(image_path)};base64,{base64_image}"
+
+        part = {"type": "image_url", "image_url": image_url}
+        if cache_key is not None:
+            self._image_part_cache[cache_key] = part
+        return part
+
+    def execute(self, text: str, model: str, history: list = None, image_path: str = None) -> dict:
+        """
+        Реализует отправку мультимодального запроса, объединяющего текст и изображение.
+        """
+        if not image_path:
+            return {"error": "Image path is required for ImageRequestStrategy."}
+
+        # Формируем сообщение для чата
+        messages = self.__build_messages(text, image_path)
+        if not messages:
+            return {"error": "Failed to encode image."}
+
         chat_response = self.client.chat.complete(
             model=model,
             messages=messages
@@ -111,38 +309,237 @@ class ImageRequestStrategy(RequestStrategy):
 
         return result
 
+    async def aexecute(self, text: str, model: str, history: list = None, image_path: str = None) -> dict:
+        """
+        Асинхронная отправка мультимодального запроса.
+        """
+        if not image_path:
+            return {"error": "Image path is required for ImageRequestStrategy."}
+
+        # Сборка сообщения при промахе кеша делает синхронную загрузку
+        # файла (или чтение с диска и base64), поэтому уходит в поток,
+        # чтобы не блокировать цикл событий
+        messages = await asyncio.to_thread(self.__build_messages, text, image_path)
+        if not messages:
+            return {"error": "Failed to encode image."}
+
+        chat_response = await self.client.chat.complete_async(
+            model=model,
+            messages=messages
+        )
+
+        result = {
+            "role": "assistant",
+            "content": chat_response.choices[0].message.content
+        }
+
+        return result
+
+class BatchRequestStrategy(RequestStrategy):
+    """
+    Конкретная реализация стратегии для пакетной отправки запросов
+    через Batch API Mistral. Подходит для офлайн-нагрузок:
+    медленнее одиночного запроса, но заметно дешевле и пропускает
+    большие объёмы запросов за один вызов.
+    """
+    def __init__(self, client: Mistral) -> None:
+        self.client = client
+
+    def submit(self, prompts: list[str], model: str) -> str:
+        """
+        Загружает запросы одним JSONL-файлом и создаёт batch-задачу.
+        Возвращает идентификатор задачи.
+        """
+        lines = []
+        for i, prompt in enumerate(prompts):
+            lines.append(json.dumps({
+                "custom_id": str(i),
+                "body": {
+                    "model": model,
+                    "messages": [{"role": "user", "content": prompt}]
+                }
+            }, ensure_ascii=False))
+        buffer = "\n".join(lines).encode("utf-8")
+
+        batch_file = self.client.files.upload(
+            file={"file_name": "batch.jsonl", "content": buffer},
+            purpose="batch"
+        )
+        job = self.client.batch.jobs.create(
+            input_files=[batch_file.id],
+            endpoint="/v1/chat/completions",
+            model=model
+        )
+        return job.id
+
+    def fetch(self, job_id: str, expected: int, poll_interval: float = 5.0) -> list[dict]:
+        """
+        Ждёт завершения batch-задачи и возвращает ответы
+        в порядке исходных запросов. Запросы, завершившиеся ошибкой
+        внутри успешной задачи, попадают в файл ошибок, а не в вывод,
+        поэтому их места заполняются словарями с ключом "error" —
+        список всегда длины expected и выровнен с запросами.
+        """
+        while True:
+            job = self.client.batch.jobs.get(job_id=job_id)
+            if job.status == "SUCCESS":
+                break
+            if job.status in ("FAILED", "CANCELLED", "TIMEOUT_EXCEEDED"):
+                raise RuntimeError(f"Batch-задача {job_id} завершилась со статусом {job.status}")
+            time.sleep(poll_interval)
+
+        output = self.client.files.download(file_id=job.output_file)
+        results = {}
+        for line in output.read().decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            content = entry["response"]["body"]["choices"][0]["message"]["content"]
+            results[int(entry["custom_id"])] = {"role": "assistant", "content": content}
+        return [
+            results.get(i, {"error": f"Request {i} failed in batch job {job_id}."})
+            for i in range(expected)
+        ]
+
+    def execute(self, text: str, model: str, history: list = None, image_path: str = None) -> dict:
+        """
+        Отправляет одиночный запрос как batch-задачу из одного элемента.
+        """
+        job_id = self.submit([text], model)
+        return self.fetch(job_id, expected=1)[0]
+
+    async def aexecute(self, text: str, model: str, history: list = None, image_path: str = None) -> dict:
+        """
+        Асинхронная обёртка над execute: batch-поллинг выполняется в потоке.
+        """
+        return await asyncio.to_thread(self.execute, text, model, history, image_path)
+
+class _RateLimiter:
+    """
+    Токен-бакет под лимит запросов в минуту.
+    Удерживает темп чуть ниже квоты аккаунта, чтобы параллельные
+    запросы не упирались в 429 и не теряли время на повторных попытках.
+    """
+    def __init__(self, rpm: int) -> None:
+        self.rpm = rpm
+        self.tokens = float(rpm)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(float(self.rpm), self.tokens + (now - self.updated) * self.rpm / 60)
+        self.updated = now
+
+    def acquire(self) -> None:
+        """Синхронное ожидание свободного токена."""
+        self._refill()
+        while self.tokens < 1:
+            time.sleep((1 - self.tokens) * 60 / self.rpm)
+            self._refill()
+        self.tokens -= 1
+
+    async def aacquire(self) -> None:
+        """Асинхронное ожидание: спит в цикле событий, а не в потоке."""
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) * 60 / self.rpm)
+                self._refill()
+            self.tokens -= 1
+
 class MistralRequestContext:
     """
     Контекст для работы со стратегиями запросов к Mistral
     Реализуется паттерн Стратегия
     """
-    def __init__(self, strategy: RequestStrategy) -> None:
+    def __init__(self, strategy: RequestStrategy, limiter: _RateLimiter = None) -> None:
         self.strategy = strategy
+        self.limiter = limiter
 
     def execute_strategy(self, text: str, model: str, history: list = None, image_path: str = None) -> dict:
+        if self.limiter:
+            self.limiter.acquire()
         return self.strategy.execute(text, model, history, image_path)
 
+    async def aexecute_strategy(self, text: str, model: str, history: list = None, image_path: str = None) -> dict:
+        if self.limiter:
+            await self.limiter.aacquire()
+        return await self.strategy.aexecute(text, model, history, image_path)
+
+class HistoryBranch:
+    """
+    Ветка истории: индекс на префикс общего журнала сообщений плюс
+    собственный хвост. Создание ветки — O(1), сообщения основной
+    линии не копируются, поэтому альтернативные продолжения диалога
+    можно исследовать параллельно (например, через ask_many).
+    """
+    def __init__(self, head: int, history_head: int) -> None:
+        # Индексы в двух журналах фасада: _history_msgs и history.
+        # После сжатия истории их длины расходятся, поэтому ветка
+        # помнит обе точки ветвления
+        self.head = head
+        self.history_head = history_head
+        self.tail: list[dict] = []
+
 class ChatFacade:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, rpm: int = 500):
         self.api_key = api_key
         self.models = {
             "text": ["mistral-large-latest"],
             "image": ["pixtral-12b-2409"]
         }
-        self.text_strategy = TextRequestStrategy(api_key=self.api_key)
-        self.image_strategy = ImageRequestStrategy(api_key=self.api_key)
-        self.request_context = MistralRequestContext(self.text_strategy)
-        self.model = self.select_model()
+        self._limiter = _RateLimiter(rpm)
+        # Модель выбирается при первом запуске цикла общения
+        self.model: str = None
         self.history = []
+        # Готовый к отправке список сообщений: передаётся в стратегию
+        # по ссылке, без пересборки на каждом ходе
+        self._history_msgs: list[dict] = []
+        # Количество незавершённых веток: пока они живы, сжатие
+        # истории отключено, иначе их индексы станут недействительными
+        self._live_branches = 0
+
+    # Клиент и стратегии создаются лениво, при первом обращении:
+    # конструирование фасада (и тем более импорт модуля) не должно
+    # поднимать TLS-контекст и пулы соединений
+    @functools.cached_property
+    def client(self) -> Mistral:
+        # Один клиент на все стратегии: общий пул keep-alive-соединений.
+        # HTTP/2 мультиплексирует параллельные запросы ask_many
+        # по одному соединению вместо очереди TCP/TLS-рукопожатий
+        # (требуется пакет httpx[http2])
+        limits = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+        return Mistral(
+            api_key=self.api_key,
+            client=httpx.Client(http2=True, limits=limits, timeout=60.0),
+            async_client=httpx.AsyncClient(http2=True, limits=limits, timeout=60.0)
+        )
+
+    @functools.cached_property
+    def text_strategy(self) -> TextRequestStrategy:
+        return TextRequestStrategy(client=self.client)
+
+    @functools.cached_property
+    def image_strategy(self) -> ImageRequestStrategy:
+        return ImageRequestStrategy(client=self.client)
+
+    @functools.cached_property
+    def batch_strategy(self) -> BatchRequestStrategy:
+        return BatchRequestStrategy(client=self.client)
+
+    @functools.cached_property
+    def request_context(self) -> MistralRequestContext:
+        return MistralRequestContext(self.text_strategy, limiter=self._limiter)
 
     def change_strategy(self, strategy_type: str) -> None:
         """
         Метод для смены текущей стратегии запроса.
         """
         if strategy_type == "text":
-            self.request_context = MistralRequestContext(self.text_strategy)
+            self.request_context = MistralRequestContext(self.text_strategy, limiter=self._limiter)
         elif strategy_type == "image":
-            self.request_context = MistralRequestContext(self.image_strategy)
+            self.request_context = MistralRequestContext(self.image_strategy, limiter=self._limiter)
         else:
             raise ValueError("Неверный тип стратегии. Выберите 'text' или 'image'.")
 
@@ -150,7 +547,7 @@ class ChatFacade:
         """
         Позволяет выбрать модель из списка, соответствующую текущей стратегии.
         """
-        model_type = 'text' if isinstance(self.request_context.strategy, TextRequestStrategy) else 'image'
+        model_type = self.request_context.strategy.model_type
         model = input(f"Выберите модель из списка {self.models[model_type]}: ")
         if model not in self.models[model_type]:
             raise ValueError('Неверная модель')
@@ -161,16 +558,137 @@ class ChatFacade:
         Основной метод для отправки запроса.
         Делегирует выполнение запроса текущей стратегии.
         """
-        # Получаем текущую историю
-        current_history = [msg for _, msg in self.history]
+        response = self.request_context.execute_strategy(text=text, model=model, history=self._history_msgs, image_path=image_path)
+
+        # Обновляем историю: кортежи хранят ссылки на те же словари
+        user_message = {"role": "user", "content": text}
+        self._history_msgs.append(user_message)
+        self._history_msgs.append(response)
+        self.history.append((text, user_message))
+        self.history.append((text, response))
+        self._compact()
+        return response
 
-        response = self.request_context.execute_strategy(text=text, model=model, history=current_history, image_path=image_path)
+    async def aask_question(self, text: str, model: str, image_path: str = None) -> dict:
+        """
+        Асинхронный вариант ask_question: не блокирует цикл событий,
+        история обновляется так же.
+        """
+        response = await self.request_context.aexecute_strategy(text=text, model=model, history=self._history_msgs, image_path=image_path)
 
-        # Обновляем историю
-        self.history.append((text, {"role": "user", "content": text}))
+        user_message = {"role": "user", "content": text}
+        self._history_msgs.append(user_message)
+        self._history_msgs.append(response)
+        self.history.append((text, user_message))
         self.history.append((text, response))
+        await asyncio.to_thread(self._compact)
         return response
 
+    def _compact(self, max_turns: int = 20, max_tokens: int = 6000) -> None:
+        """
+        Сжимает историю, когда она превышает бюджет: последние max_turns
+        ходов остаются дословно, более старые сообщения заменяются одним
+        системным сообщением с кратким пересказом. Без этого каждый ход
+        отправляет модели весь накопленный диалог целиком.
+        """
+        # Пока есть незавершённые ветки, журнал не трогаем:
+        # их индексы указывают в несжатую историю
+        if self._live_branches > 0:
+            return
+
+        # Грубая оценка токенов: ~4 символа на токен
+        approx_tokens = sum(
+            len(msg["content"]) // 4
+            for msg in self._history_msgs
+            if isinstance(msg.get("content"), str)
+        )
+        keep = max_turns * 2
+        if len(self._history_msgs) <= keep or approx_tokens <= max_tokens:
+            return
+
+        old_msgs = self._history_msgs[:-keep]
+        transcript = "\n".join(
+            f"{msg['role']}: {msg['content']}"
+            for msg in old_msgs
+            if isinstance(msg.get("content"), str)
+        )
+        summary = self.text_strategy.execute(
+            text=f"Кратко перескажи этот диалог, сохранив важные факты и договорённости:\n\n{transcript}",
+            model=self.models["text"][0]
+        )
+        self._history_msgs[:-keep] = [{"role": "system", "content": f"Краткое содержание предыдущего диалога: {summary['content']}"}]
+
+    def fork(self) -> HistoryBranch:
+        """
+        Создаёт ветку от текущего конца истории. O(1), без копирования.
+        Каждую ветку нужно завершить через commit или drop.
+        """
+        self._live_branches += 1
+        return HistoryBranch(head=len(self._history_msgs), history_head=len(self.history))
+
+    async def ask_on_branch(self, branch: HistoryBranch, text: str) -> dict:
+        """
+        Задаёт вопрос в рамках ветки: контекст — префикс общего журнала
+        до точки ветвления плюс хвост самой ветки. Основная история
+        не затрагивается, пока ветка не закоммичена.
+        """
+        # Срез копирует только ссылки на словари, не их содержимое
+        messages = self._history_msgs[:branch.head] + branch.tail
+        response = await self.request_context.aexecute_strategy(text=text, model=self.model, history=messages)
+
+        branch.tail.append({"role": "user", "content": text})
+        branch.tail.append(response)
+        return response
+
+    def commit(self, branch: HistoryBranch) -> None:
+        """
+        Делает ветку основной линией: сообщения после точки ветвления
+        заменяются хвостом ветки. Ветка считается завершённой;
+        для продолжения работы создайте новую через fork.
+        """
+        del self._history_msgs[branch.head:]
+        self._history_msgs.extend(branch.tail)
+
+        del self.history[branch.history_head:]
+        for i in range(0, len(branch.tail) - 1, 2):
+            user_message = branch.tail[i]
+            self.history.append((user_message["content"], user_message))
+            self.history.append((user_message["content"], branch.tail[i + 1]))
+
+        branch.tail = []
+        self._live_branches = max(0, self._live_branches - 1)
+
+    def drop(self, branch: HistoryBranch) -> None:
+        """
+        Отбрасывает ветку. Общий журнал не изменяется.
+        """
+        branch.tail.clear()
+        self._live_branches = max(0, self._live_branches - 1)
+
+    def ask_batch(self, prompts: list[str]) -> list[dict]:
+        """
+        Отправляет список запросов через Batch API.
+        Дешевле и производительнее последовательных вызовов ask_question,
+        но результат приходит только после завершения всей задачи.
+        """
+        job_id = self.batch_strategy.submit(prompts, self.model)
+        return self.batch_strategy.fetch(job_id, expected=len(prompts))
+
+    async def ask_many(self, prompts: list[str], max_concurrency: int = 8) -> list[dict]:
+        """
+        Параллельно отправляет несколько запросов через asyncio.gather.
+        Количество одновременных запросов ограничено семафором.
+        История не обновляется: запросы независимы друг от друга.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def one(prompt: str) -> dict:
+            async with semaphore:
+                return await self.request_context.aexecute_strategy(text=prompt, model=self.model, history=self._history_msgs)
+
+        tasks = [one(prompt) for prompt in prompts]
+        return await asyncio.gather(*tasks)
+
     def get_history(self) -> list[tuple[str, dict]]:
         """
         Возвращает историю запросов и ответов.
@@ -182,31 +700,61 @@ class ChatFacade:
         Очищает историю сообщений.
         """
         self.history.clear()
+        self._history_msgs.clear()
 
-    def __call__(self):
+    async def arun(self):
         """
-        Запуск фасада
+        Асинхронный цикл общения: ввод выполняется в отдельном потоке,
+        поэтому фоновые задачи (предзагрузка изображения) идут
+        параллельно с набором текста.
         """
-        print("Здравствуйте! Я готов помочь вам. Для выхода введите exit")
+        print("Здравствуйте! Я готов помочь вам. Для выхода введите exit, для смены стратегии и модели — /mode")
+        if self.model is None:
+            self.model = await asyncio.to_thread(self.select_model)
         while True:
-            text = input("\nВведите текст запроса: ")
+            image_path = None
+            upload_task = None
+            if self.request_context.strategy.needs_image:
+                image_path = await asyncio.to_thread(input, "Введите путь к изображению: ")
+                # Загружаем изображение в фоне, пока пользователь
+                # набирает текст вопроса
+                upload_task = asyncio.create_task(
+                    asyncio.to_thread(self.image_strategy.preupload, image_path)
+                )
+
+            text = await asyncio.to_thread(input, "\nВведите текст запроса: ")
             if text.lower() == "exit":
+                if upload_task:
+                    upload_task.cancel()
                 print('До свидания!')
                 break
 
-            strategy_type = input("Введите тип стратегии (text или image): ")
-            self.change_strategy(strategy_type)
+            # Стратегия и модель выбираются один раз и остаются «липкими»:
+            # переспрашивание на каждом ходе тратило два input()
+            # и сбрасывало непрерывность диалога для серверного кеша
+            if text.startswith("/mode"):
+                if upload_task:
+                    upload_task.cancel()
+                strategy_type = await asyncio.to_thread(input, "Введите тип стратегии (text или image): ")
+                self.change_strategy(strategy_type)
+                self.model = await asyncio.to_thread(self.select_model)
+                continue
 
-            model = self.select_model()
-            image_path = None
-            if strategy_type == "image":
-                image_path = input("Введите путь к изображению: ")
+            if upload_task:
+                await upload_task
 
-            response = self.ask_question(text=text, model=model, image_path=image_path if image_path else None)
+            response = await self.aask_question(text=text, model=self.model, image_path=image_path if image_path else None)
 
             # Выводим последний ответ
             print(response)
 
+    def __call__(self):
+        """
+        Запуск фасада
+        """
+        asyncio.run(self.arun())
+
 # Пример использования
-chat_facade = ChatFacade(api_key=MISTAL_API_KEY)
-chat_facade()
+if __name__ == "__main__":
+    chat_facade = ChatFacade(api_key=os.environ["MISTRAL_API_KEY"])
+    chat_facade()